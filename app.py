@@ -1,19 +1,112 @@
 from __future__ import annotations
 
+import hashlib
 import io
+import os
+import posixpath
 import re
+import threading
+import time
 import zipfile
-from datetime import datetime
-from pathlib import Path
+from bisect import bisect_right
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from datetime import datetime, timedelta
+from itertools import chain
 from typing import Optional, Tuple
 
-import openpyxl
-from flask import Flask, jsonify, render_template, request, send_file
+try:
+    # libxml2-backed parsing is several times faster on large sheets.
+    from lxml import etree as ET
+
+    HAVE_LXML = True
+except ImportError:
+    import xml.etree.ElementTree as ET
+
+    HAVE_LXML = False
+
+from flask import Flask, Response, abort, jsonify, render_template, request
 
 app = Flask(__name__)
 
 ALLOWED_EXTENSIONS = {".xlsx", ".xlsm"}
 MAX_FILE_SIZE_BYTES = 50 * 1024 * 1024
+# Headroom for the multipart framing and form fields around the file.
+MAX_REQUEST_SIZE_BYTES = MAX_FILE_SIZE_BYTES + 1024 * 1024
+MEDIA_READ_WORKERS = min(4, os.cpu_count() or 1)
+# Media parts at least this large are copied into the output ZIP in chunks.
+STREAM_MEMBER_MIN_BYTES = 8 * 1024 * 1024
+COPY_CHUNK_BYTES = 1024 * 1024
+PARSE_CACHE_SIZE = 32
+
+SAFE_NAME_RE = re.compile(r"[^A-Za-z0-9._-]+")
+# First three signature bytes, as the high bytes of a big-endian 32-bit int.
+IMAGE_MAGIC = {
+    0x89504E00: "png",
+    0xFFD8FF00: "jpg",
+    0x47494600: "gif",
+    0x52494600: "webp",  # "RIFF", confirmed by "WEBP" at offset 8
+    0x49492A00: "tif",
+    0x4D4D0000: "tif",
+    0x01000000: "emf",  # EMR_HEADER, confirmed by " EMF" at offset 40
+    0xD7CDC600: "wmf",
+}
+# Already entropy-coded; deflating these again only burns CPU.
+PRECOMPRESSED_TYPES = {"png", "jpg", "gif", "webp"}
+# Number formats openpyxl reads as dates: the built-in date ids, and custom
+# codes with date/time tokens outside quoted text and [colour]-style sections.
+BUILTIN_DATE_FORMATS = frozenset(range(14, 23)) | {45, 46, 47}
+BUILTIN_DURATION_FORMAT = 46
+DATE_FORMAT_STRIP_RE = re.compile(r'".*?"|\[(?!hh?\]|mm?\]|ss?\])[^\]]*\]')
+DATE_FORMAT_RE = re.compile(r"(?<![_\\])[dmhysDMHYS]")
+DURATION_FORMAT_RE = re.compile(
+    r"\[hh?\](:mm(:ss(\.0*)?)?)?|\[mm?\](:ss(\.0*)?)?|\[ss?\](\.0*)?", re.IGNORECASE
+)
+EXCEL_EPOCH = datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime(1904, 1, 1)
+
+WORKBOOK_PATH = "xl/workbook.xml"
+WORKBOOK_RELS_PATH = "xl/_rels/workbook.xml.rels"
+NS_MAIN = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+NS_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+NS_PKG_REL = "http://schemas.openxmlformats.org/package/2006/relationships"
+NS_XDR = "http://schemas.openxmlformats.org/drawingml/2006/spreadsheetDrawing"
+NS_A = "http://schemas.openxmlformats.org/drawingml/2006/main"
+
+SHEET_TAG = f"{{{NS_MAIN}}}sheet"
+ROW_TAG = f"{{{NS_MAIN}}}row"
+CELL_TAG = f"{{{NS_MAIN}}}c"
+VALUE_TAG = f"{{{NS_MAIN}}}v"
+INLINE_STRING_TAG = f"{{{NS_MAIN}}}is"
+SHARED_STRING_TAG = f"{{{NS_MAIN}}}si"
+TEXT_TAG = f"{{{NS_MAIN}}}t"
+RUN_TAG = f"{{{NS_MAIN}}}r"
+WORKBOOK_PR_TAG = f"{{{NS_MAIN}}}workbookPr"
+NUM_FMT_TAG = f"{{{NS_MAIN}}}numFmt"
+CELL_XFS_TAG = f"{{{NS_MAIN}}}cellXfs"
+XF_TAG = f"{{{NS_MAIN}}}xf"
+RELATIONSHIP_TAG = f"{{{NS_PKG_REL}}}Relationship"
+REL_ID_ATTR = f"{{{NS_REL}}}id"
+EMBED_ATTR = f"{{{NS_REL}}}embed"
+FROM_TAG = f"{{{NS_XDR}}}from"
+FROM_ROW_TAG = f"{{{NS_XDR}}}row"
+FROM_COL_TAG = f"{{{NS_XDR}}}col"
+BLIP_TAG = f"{{{NS_A}}}blip"
+ANCHOR_TAGS = {
+    f"{{{NS_XDR}}}twoCellAnchor",
+    f"{{{NS_XDR}}}oneCellAnchor",
+    f"{{{NS_XDR}}}absoluteAnchor",
+}
+
+# Users typically upload the same workbook to /get_sheets and then to
+# /extract_images, so parse results are cached: the sheet list by a digest of
+# workbook.xml and its rels, sheet layouts by upload digest.
+_parse_cache: OrderedDict[tuple, object] = OrderedDict()
+_parse_cache_lock = threading.Lock()
+
+
+app.config["MAX_CONTENT_LENGTH"] = MAX_REQUEST_SIZE_BYTES
 
 
 @app.route("/")
@@ -25,133 +118,532 @@ def _json_error(message: str, status_code: int = 400):
     return jsonify(status="error", message=message), status_code
 
 
+@app.errorhandler(413)
+def _request_too_large(_exc):
+    return _json_error("File too large. Please upload a file up to 50MB.", 413)
+
+
+def _magic(data: bytes) -> int:
+    return int.from_bytes(data[:4], "big") & 0xFFFFFF00
+
+
+def _image_type(data: bytes) -> Optional[str]:
+    kind = IMAGE_MAGIC.get(_magic(data))
+    if kind == "webp" and data[8:12] != b"WEBP":
+        return None
+    if kind == "emf" and data[40:44] != b" EMF":
+        return None
+    if kind is None and data[:2] == b"BM":
+        return "bmp"
+    return kind
+
+
 def _detect_ext(data: bytes) -> str:
-    if data.startswith(b"\x89PNG\r\n\x1a\n"):
-        return "png"
-    if data.startswith(b"\xff\xd8\xff"):
-        return "jpg"
-    if data.startswith(b"GIF8"):
-        return "gif"
-    return "png"
+    return _image_type(data) or "png"
+
+
+def _compress_type(data: bytes) -> int:
+    if _image_type(data) in PRECOMPRESSED_TYPES:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
 
 
 def _safe_name(value) -> str:
     value = str(value).strip() if value not in (None, "") else "Image"
-    return re.sub(r"[^A-Za-z0-9._-]+", "_", value).strip("._-") or "Image"
+    return SAFE_NAME_RE.sub("_", value).strip("._-") or "Image"
 
 
-def _anchor_row_col(img) -> Tuple[Optional[int], Optional[int]]:
-    anchor = getattr(img, "anchor", None)
-    if anchor:
-        from_cell = getattr(anchor, "_from", None)
-        if from_cell:
-            return from_cell.row + 1, from_cell.col + 1
-    return None, None
+def _read_up(values: dict[int, object], rows: list) -> list:
+    """Nearest non-empty value at or above each row (1-based); None for no row."""
+    filled_rows = sorted(values)
+    found = []
+    for row in rows:
+        i = bisect_right(filled_rows, row) if row else 0
+        found.append(values[filled_rows[i - 1]] if i else None)
+    return found
 
 
-def _read_up(ws, row: Optional[int], col: int):
-    if not row:
-        return None
-    for r in range(row, 0, -1):
-        value = ws.cell(r, col).value
-        if value not in (None, ""):
-            return value
-    return None
+def _fromstring(data: bytes):
+    """Parse an XML part of the upload without expanding entities."""
+    if HAVE_LXML:
+        # The upload is untrusted: no entity expansion, no network fetches.
+        parser = ET.XMLParser(resolve_entities=False, no_network=True)
+        return ET.fromstring(data, parser)
+    return ET.fromstring(data)
 
 
-def _next_unique_filename(base_name: str, ext: str, seen: set[str]) -> str:
+def _read_rels(
+    archive: zipfile.ZipFile, part_path: str, rel_type: str
+) -> dict[str, str]:
+    folder, name = posixpath.split(part_path)
+    try:
+        data = archive.read(posixpath.join(folder, "_rels", f"{name}.rels"))
+    except KeyError:
+        return {}
+
+    rels: dict[str, str] = {}
+    for rel in _fromstring(data).iter(RELATIONSHIP_TAG):
+        if rel.get("TargetMode") == "External":
+            continue
+        if not rel.get("Type", "").endswith(rel_type):
+            continue
+        target = rel.get("Target") or ""
+        if target.startswith("/"):
+            rels[rel.get("Id")] = target.lstrip("/")
+        else:
+            rels[rel.get("Id")] = posixpath.normpath(posixpath.join(folder, target))
+    return rels
+
+
+def _sheet_index(archive: zipfile.ZipFile) -> dict[str, Optional[str]]:
+    """Map each sheet name, in workbook order, to its worksheet part path."""
+    root = _fromstring(archive.read(WORKBOOK_PATH))
+    rels = _read_rels(archive, WORKBOOK_PATH, "/worksheet")
+    return {
+        sheet.get("name"): rels.get(sheet.get(REL_ID_ATTR))
+        for sheet in root.iter(SHEET_TAG)
+    }
+
+
+def _sheet_index_key(archive: zipfile.ZipFile) -> tuple:
+    """Cache key for _sheet_index: a digest of workbook.xml and its rels.
+
+    Both parts are around a kilobyte, so hashing them is cheap, and unlike the
+    CRCs in the central directory a digest cannot be forged to collide with
+    another upload's.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for path in (WORKBOOK_PATH, WORKBOOK_RELS_PATH):
+        try:
+            data = archive.read(path)
+        except KeyError:
+            data = b""
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return ("sheets", digest.hexdigest())
+
+
+def _release(elem) -> None:
+    """Free a fully parsed element; under lxml also drop its earlier siblings."""
+    elem.clear()
+    if HAVE_LXML:
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+def _iterparse(stream, events, tags):
+    """iterparse limited to the given tags; lxml filters the rest out in C."""
+    if HAVE_LXML:
+        return ET.iterparse(
+            stream, events=events, tag=tags, resolve_entities=False, no_network=True
+        )
+    return ET.iterparse(stream, events=events)
+
+
+def _drawing_images(
+    archive: zipfile.ZipFile, sheet_path: str
+) -> list[Tuple[Optional[int], Optional[int], Optional[str]]]:
+    """Return (row, col, media path) for every picture anchored on the sheet.
+
+    Rows and columns are 1-based, matching the anchor's top-left cell.
+    """
+    images = []
+    for drawing_path in _read_rels(archive, sheet_path, "/drawing").values():
+        media = _read_rels(archive, drawing_path, "/image")
+        row = col = embed = None
+        with archive.open(drawing_path) as stream:
+            for _event, elem in _iterparse(
+                stream, ("end",), (FROM_TAG, BLIP_TAG, *ANCHOR_TAGS)
+            ):
+                if elem.tag == FROM_TAG:
+                    row = int(elem.findtext(FROM_ROW_TAG, "0")) + 1
+                    col = int(elem.findtext(FROM_COL_TAG, "0")) + 1
+                elif elem.tag == BLIP_TAG and embed is None:
+                    embed = elem.get(EMBED_ATTR)
+                elif elem.tag in ANCHOR_TAGS:
+                    if embed is not None:
+                        images.append((row, col, media.get(embed)))
+                    row = col = embed = None
+                    _release(elem)
+    return images
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for ch in ref:
+        if not ch.isalpha():
+            break
+        index = index * 26 + ord(ch.upper()) - 64
+    return index
+
+
+def _rich_text(elem) -> str:
+    # Plain <t> plus <r><t> runs; phonetic <rPh> hints are not cell text.
+    parts = []
+    for child in elem:
+        if child.tag == TEXT_TAG:
+            parts.append(child.text or "")
+        elif child.tag == RUN_TAG:
+            parts.append(child.findtext(TEXT_TAG) or "")
+    return "".join(parts)
+
+
+def _cell_value(cell):
+    kind = cell.get("t", "n")
+    if kind == "inlineStr":
+        inline = cell.find(INLINE_STRING_TAG)
+        return _rich_text(inline) if inline is not None else None
+    text = cell.findtext(VALUE_TAG)
+    if not text or kind in ("s", "str", "e", "d"):
+        return text
+    if kind == "b":
+        return text == "1"
+    try:
+        if "." in text or "E" in text or "e" in text:
+            return float(text)
+        return int(text)
+    except ValueError:
+        return text
+
+
+def _is_date_format(code: str) -> bool:
+    code = DATE_FORMAT_STRIP_RE.sub("", code.split(";")[0])
+    return DATE_FORMAT_RE.search(code) is not None
+
+
+def _date_styles(archive: zipfile.ZipFile) -> dict[int, bool]:
+    """Map each date-formatted cell style index to whether it is a duration."""
+    styles: dict[int, bool] = {}
+    for path in _read_rels(archive, WORKBOOK_PATH, "/styles").values():
+        root = _fromstring(archive.read(path))
+        codes = {
+            fmt.get("numFmtId"): fmt.get("formatCode") or ""
+            for fmt in root.iter(NUM_FMT_TAG)
+        }
+        cell_xfs = root.find(CELL_XFS_TAG)
+        xfs = cell_xfs.findall(XF_TAG) if cell_xfs is not None else []
+        for idx, xf in enumerate(xfs):
+            fmt_id = xf.get("numFmtId") or "0"
+            code = codes.get(fmt_id)
+            if code is None:
+                if int(fmt_id) in BUILTIN_DATE_FORMATS:
+                    styles[idx] = int(fmt_id) == BUILTIN_DURATION_FORMAT
+            elif _is_date_format(code):
+                styles[idx] = DURATION_FORMAT_RE.search(code.split(";")[0]) is not None
+    return styles
+
+
+def _date_epoch(archive: zipfile.ZipFile) -> datetime:
+    props = _fromstring(archive.read(WORKBOOK_PATH)).find(WORKBOOK_PR_TAG)
+    if props is not None and props.get("date1904") in ("1", "true"):
+        return EXCEL_EPOCH_1904
+    return EXCEL_EPOCH
+
+
+def _from_excel(serial, epoch: datetime, duration: bool):
+    """Convert a date serial to datetime, time or timedelta as openpyxl does."""
+    if duration:
+        return timedelta(seconds=round(serial * 86400, 3))
+    day, fraction = divmod(serial, 1)
+    diff = timedelta(milliseconds=round(fraction * 86400000))
+    if 0 <= serial < 1 and diff.days == 0:
+        return (datetime.min + diff).time()
+    # Serials below 60 predate Excel's phantom 1900-02-29.
+    if 0 < serial < 60 and epoch == EXCEL_EPOCH:
+        day += 1
+    return epoch + timedelta(days=day) + diff
+
+
+def _shared_strings(archive: zipfile.ZipFile, indices: set[int]) -> dict[int, str]:
+    strings: dict[int, str] = {}
+    if not indices:
+        return strings
+    last = max(indices)
+    for path in _read_rels(archive, WORKBOOK_PATH, "/sharedStrings").values():
+        idx = 0
+        with archive.open(path) as stream:
+            for _event, elem in _iterparse(stream, ("end",), SHARED_STRING_TAG):
+                if elem.tag != SHARED_STRING_TAG:
+                    continue
+                if idx in indices:
+                    strings[idx] = _rich_text(elem)
+                _release(elem)
+                idx += 1
+                if idx > last:
+                    break
+    return strings
+
+
+def _column_values(
+    archive: zipfile.ZipFile, sheet_path: str, col: int, max_row: int
+) -> dict[int, object]:
+    """Collect non-empty cached values of one column, stopping after max_row."""
+    values: dict[int, object] = {}
+    shared: dict[int, int] = {}
+    styled: dict[int, int] = {}
+    row = cell_col = 0
+    with archive.open(sheet_path) as stream:
+        for event, elem in _iterparse(stream, ("start", "end"), (ROW_TAG, CELL_TAG)):
+            if event == "start":
+                if elem.tag == ROW_TAG:
+                    row = int(elem.get("r") or row + 1)
+                    cell_col = 0
+                    if row > max_row:
+                        break
+                continue
+            if elem.tag == CELL_TAG:
+                ref = elem.get("r")
+                cell_col = _column_index(ref) if ref else cell_col + 1
+                if cell_col == col:
+                    value = _cell_value(elem)
+                    if elem.get("t") == "s" and value:
+                        shared[row] = int(value)
+                    elif value not in (None, ""):
+                        values[row] = value
+                        style = elem.get("s")
+                        numeric = elem.get("t", "n") == "n" and not isinstance(value, str)
+                        if style and numeric:
+                            styled[row] = int(style)
+                _release(elem)
+            elif elem.tag == ROW_TAG:
+                _release(elem)
+
+    strings = _shared_strings(archive, set(shared.values()))
+    for r, idx in shared.items():
+        if strings.get(idx):
+            values[r] = strings[idx]
+
+    # Date-formatted numbers come back as dates, as openpyxl returned them.
+    date_styles = _date_styles(archive) if styled else {}
+    if any(style in date_styles for style in styled.values()):
+        epoch = _date_epoch(archive)
+        for r, style in styled.items():
+            if style in date_styles:
+                try:
+                    values[r] = _from_excel(values[r], epoch, date_styles[style])
+                except (OverflowError, ValueError):
+                    pass
+    return values
+
+
+def _read_member(archive: zipfile.ZipFile, path: Optional[str]):
+    try:
+        info = archive.getinfo(path)
+        if info.file_size >= STREAM_MEMBER_MIN_BYTES:
+            return info, None
+        return archive.read(info), None
+    except Exception as exc:
+        return None, exc
+
+
+def _read_members(archive: zipfile.ZipFile, paths: list[Optional[str]]):
+    """Yield (data, error) for each path in order, inflating on worker threads.
+
+    Large members are not read here: data is their ZipInfo, for the writer to
+    copy across in chunks.
+
+    Only a few members are read ahead of the consumer, so memory stays bounded
+    by a handful of images rather than the whole sheet. Excel stores repeated
+    pictures as one media part; such a part is read once and kept only until
+    its last reference has been yielded.
+    """
+    remaining = Counter(paths)
+    shared = {}
+    pending = deque()
+
+    def next_result():
+        path, future = pending.popleft()
+        remaining[path] -= 1
+        if not remaining[path]:
+            shared.pop(path, None)
+        return future.result()
+
+    with ThreadPoolExecutor(max_workers=MEDIA_READ_WORKERS) as pool:
+        for path in paths:
+            future = shared.get(path)
+            if future is None:
+                future = pool.submit(_read_member, archive, path)
+                if remaining[path] > 1:
+                    shared[path] = future
+            pending.append((path, future))
+            if len(pending) > MEDIA_READ_WORKERS * 2:
+                yield next_result()
+        while pending:
+            yield next_result()
+
+
+def _next_unique_filename(base_name: str, ext: str, seen: dict[str, int]) -> str:
+    # seen maps every issued name to the next suffix to try for that name, so
+    # repeated vendors resume counting instead of re-probing _2, _3, ...
     candidate = f"{base_name}.{ext}"
     if candidate not in seen:
-        seen.add(candidate)
+        seen[candidate] = 2
         return candidate
 
-    counter = 2
-    while True:
-        candidate = f"{base_name}_{counter}.{ext}"
-        if candidate not in seen:
-            seen.add(candidate)
-            return candidate
+    counter = seen[candidate]
+    while f"{base_name}_{counter}.{ext}" in seen:
         counter += 1
+    seen[candidate] = counter + 1
+    unique = f"{base_name}_{counter}.{ext}"
+    seen[unique] = 2
+    return unique
 
 
 def _get_uploaded_file():
+    # Refuse oversized bodies before Werkzeug spools them.
+    if (request.content_length or 0) > MAX_REQUEST_SIZE_BYTES:
+        abort(413)
+
     file_obj = request.files.get("file")
     if not file_obj or not file_obj.filename:
         return None, "No file uploaded"
 
-    ext = Path(file_obj.filename).suffix.lower()
+    ext = posixpath.splitext(file_obj.filename)[1].lower()
     if ext not in ALLOWED_EXTENSIONS:
         return None, "Please upload a valid Excel file (.xlsx or .xlsm)"
 
-    file_bytes = file_obj.read()
-    if not file_bytes:
+    # Werkzeug already spooled the upload; hand that stream on instead of
+    # copying it into bytes and wrapping it again in a BytesIO.
+    upload = file_obj.stream
+    upload.seek(0, io.SEEK_END)
+    size = upload.tell()
+    upload.seek(0)
+    if not size:
         return None, "Uploaded file is empty"
-    if len(file_bytes) > MAX_FILE_SIZE_BYTES:
+    if size > MAX_FILE_SIZE_BYTES:
         return None, "File too large. Please upload a file up to 50MB."
 
-    return file_bytes, None
+    return upload, None
 
 
-@app.route("/health")
-@app.route("/backend/health")
-def health():
-    return jsonify(status="ok")
+def _upload_digest(upload) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for chunk in iter(lambda: upload.read(1024 * 1024), b""):
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
 
 
-@app.route("/get_sheets", methods=["POST"])
-@app.route("/backend/get_sheets", methods=["POST"])
-def get_sheets():
-    file_bytes, error = _get_uploaded_file()
-    if error:
-        return _json_error(error, 400)
+def _cached(key: tuple, compute):
+    with _parse_cache_lock:
+        if key in _parse_cache:
+            _parse_cache.move_to_end(key)
+            return _parse_cache[key]
 
-    try:
-        wb = openpyxl.load_workbook(
-            io.BytesIO(file_bytes), read_only=True, data_only=True
-        )
-        sheet_names = wb.sheetnames
-        wb.close()
-    except Exception as exc:
-        return _json_error(f"Could not read Excel file: {exc}", 400)
+    value = compute()
+    if value is not None:
+        with _parse_cache_lock:
+            _parse_cache[key] = value
+            while len(_parse_cache) > PARSE_CACHE_SIZE:
+                _parse_cache.popitem(last=False)
+    return value
 
-    if not sheet_names:
-        return _json_error("No sheets found in the Excel file", 400)
 
-    return jsonify(status="ok", sheets=sheet_names)
+def _sheet_layout(archive: zipfile.ZipFile, sheet_name: str):
+    """Return (images, Column D vendor of each image), or None if missing.
 
+    Only the values the Column A images are named after are kept, so a cached
+    layout grows with the images rather than with the rows of Column D.
+    """
+    sheets = _cached(_sheet_index_key(archive), lambda: _sheet_index(archive))
+    sheet_path = sheets.get(sheet_name)
+    if sheet_path is None:
+        return None
+    images = _drawing_images(archive, sheet_path)
+    rows = [row if col == 1 else None for row, col, _ in images]
+    max_row = max((row or 0 for row in rows), default=0)
+    column_d = _column_values(archive, sheet_path, 4, max_row)
+    return images, _read_up(column_d, rows)
 
-@app.route("/extract_images", methods=["POST"])
-@app.route("/backend/extract_images", methods=["POST"])
-def extract_images():
-    file_bytes, error = _get_uploaded_file()
-    if error:
-        return _json_error(error, 400)
 
-    sheet_name = (request.form.get("sheet_name") or "").strip()
-    if not sheet_name:
-        return _json_error("Missing sheet_name", 400)
+class _ZipChunkSink:
+    """Write-only file object that collects ZIP output for a streamed response.
 
-    try:
-        wb = openpyxl.load_workbook(io.BytesIO(file_bytes), data_only=True)
-    except Exception as exc:
-        return _json_error(f"Could not open workbook: {exc}", 400)
+    Without tell/seek, zipfile writes a data descriptor after each entry
+    instead of seeking back to patch its local header.
+    """
 
-    if sheet_name not in wb.sheetnames:
-        wb.close()
-        return _json_error(f'Sheet "{sheet_name}" not found in workbook', 400)
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
 
-    ws = wb[sheet_name]
-    images = list(getattr(ws, "_images", []) or [])
+    def flush(self) -> None:
+        pass
 
-    out = io.BytesIO()
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _open_large_member(archive: zipfile.ZipFile, info: zipfile.ZipInfo):
+    """Open a member and read its first chunk; return (source, first chunk)."""
+    source = archive.open(info)
+    try:
+        return source, source.read(COPY_CHUNK_BYTES)
+    except Exception:
+        source.close()
+        raise
+
+
+def _image_reads(archive: zipfile.ZipFile, paths: list[Optional[str]]):
+    """Yield (data, source, error) per path; large members arrive opened.
+
+    For a large member data is only its first chunk and source holds the rest.
+    """
+    reads = _read_members(archive, paths)
+    with closing(reads):
+        for data, exc in reads:
+            source = None
+            if isinstance(data, zipfile.ZipInfo):
+                try:
+                    source, data = _open_large_member(archive, data)
+                except Exception as open_exc:
+                    data, exc = None, open_exc
+            yield data, source, exc
+
+
+def _copy_member(
+    zf: zipfile.ZipFile, sink: _ZipChunkSink, name: str, head: bytes, source
+):
+    """Write head and the rest of source into zf chunk by chunk, yielding output."""
+    info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+    info.external_attr = 0o600 << 16
+    info.compress_type = _compress_type(head)
+    # A bare ZipInfo would deflate at zlib's default level; match writestr.
+    info._compresslevel = zf.compresslevel
+    with source, zf.open(info, "w") as dst:
+        chunk = head
+        while chunk:
+            dst.write(chunk)
+            yield sink.drain()
+            chunk = source.read(COPY_CHUNK_BYTES)
+
+
+def _iter_images_zip(
+    upload,
+    archive: zipfile.ZipFile,
+    images: list,
+    vendors: list,
+    sheet_name: str,
+    prefetched: list,
+    reads,
+):
+    sink = _ZipChunkSink()
     extracted_count = 0
     skipped_count = 0
     skipped_reasons: list[str] = []
-    seen_filenames: set[str] = set()
-
-    with zipfile.ZipFile(out, "w", compression=zipfile.ZIP_DEFLATED) as zf:
-        for idx, img in enumerate(images, start=1):
-            row, col = _anchor_row_col(img)
+    seen_filenames: dict[str, int] = {}
+
+    results = chain(prefetched, reads)
+    # Level 1 deflate: only summary.txt and uncommon media formats reach it.
+    with closing(upload), archive, closing(reads), zipfile.ZipFile(
+        sink, "w", compression=zipfile.ZIP_DEFLATED, compresslevel=1
+    ) as zf:
+        for idx, (row, col, _) in enumerate(images, start=1):
             if col != 1:
                 skipped_count += 1
                 skipped_reasons.append(
@@ -159,20 +651,23 @@ def extract_images():
                 )
                 continue
 
-            vendor = _read_up(ws, row, 4)
-            safe_vendor = _safe_name(vendor) if vendor else f"Row_{row or idx}"
-
-            try:
-                image_data = img._data()
-            except Exception as exc:
+            image_data, source, exc = next(results)
+            if exc is not None:
                 skipped_count += 1
                 skipped_reasons.append(f"Image #{idx}: could not read image data ({exc}).")
                 continue
 
+            vendor = vendors[idx - 1]
+            safe_vendor = _safe_name(vendor) if vendor else f"Row_{row or idx}"
             ext = _detect_ext(image_data)
             filename = _next_unique_filename(safe_vendor, ext, seen_filenames)
-            zf.writestr(f"images/{filename}", image_data)
+            arcname = f"images/{filename}"
+            if source is None:
+                zf.writestr(arcname, image_data, compress_type=_compress_type(image_data))
+            else:
+                yield from _copy_member(zf, sink, arcname, image_data, source)
             extracted_count += 1
+            yield sink.drain()
 
         summary_lines = [
             "Excel Image Extraction Summary",
@@ -194,22 +689,99 @@ def extract_images():
 
         zf.writestr("summary.txt", "\n".join(summary_lines))
 
-    wb.close()
-    out.seek(0)
+    yield sink.drain()
+
+
+@app.route("/health")
+@app.route("/backend/health")
+def health():
+    return jsonify(status="ok")
+
+
+@app.route("/get_sheets", methods=["POST"])
+@app.route("/backend/get_sheets", methods=["POST"])
+def get_sheets():
+    upload, error = _get_uploaded_file()
+    if error:
+        return _json_error(error, 400)
+
+    try:
+        # Sheet names live in workbook.xml; no need to load the workbook itself.
+        with zipfile.ZipFile(upload) as archive:
+            sheets = _cached(_sheet_index_key(archive), lambda: _sheet_index(archive))
+    except Exception as exc:
+        return _json_error(f"Could not read Excel file: {exc}", 400)
+
+    if not sheets:
+        return _json_error("No sheets found in the Excel file", 400)
+
+    return jsonify(status="ok", sheets=list(sheets))
+
+
+@app.route("/extract_images", methods=["POST"])
+@app.route("/backend/extract_images", methods=["POST"])
+def extract_images():
+    upload, error = _get_uploaded_file()
+    if error:
+        return _json_error(error, 400)
+
+    sheet_name = (request.form.get("sheet_name") or "").strip()
+    if not sheet_name:
+        return _json_error("Missing sheet_name", 400)
+
+    try:
+        digest = _upload_digest(upload)
+        archive = zipfile.ZipFile(upload)
+    except Exception as exc:
+        return _json_error(f"Could not open workbook: {exc}", 400)
+
+    try:
+        layout = _cached(
+            ("layout", digest, sheet_name),
+            lambda: _sheet_layout(archive, sheet_name),
+        )
+    except Exception as exc:
+        archive.close()
+        return _json_error(f"Could not open workbook: {exc}", 400)
+
+    if layout is None:
+        archive.close()
+        return _json_error(f'Sheet "{sheet_name}" not found in workbook', 400)
 
-    if extracted_count == 0:
+    images, vendors = layout
+    # Once streaming starts the status is committed, so read up to the first
+    # image that loads before answering 200. A read error later on is listed
+    # in summary.txt; only a failure midway through copying a large member
+    # can still cut the body short.
+    reads = _image_reads(archive, [path for _, col, path in images if col == 1])
+    prefetched = []
+    for result in reads:
+        prefetched.append(result)
+        if result[2] is None:
+            break
+    else:
+        archive.close()
         return _json_error(
             "No images were extracted. Ensure images are in Column A and not empty.",
             400,
         )
 
-    return send_file(
-        out,
+    # Werkzeug closes uploaded files when the request ends, which is before a
+    # streamed body is consumed, so the generator takes over the stream.
+    request.files["file"].stream = io.BytesIO()
+    return Response(
+        _iter_images_zip(
+            upload, archive, images, vendors, sheet_name, prefetched, reads
+        ),
         mimetype="application/zip",
-        as_attachment=True,
-        download_name="images.zip",
+        headers={
+            "Content-Disposition": "attachment; filename=images.zip",
+            # Let nginx pass chunks through instead of buffering the whole body.
+            "X-Accel-Buffering": "no",
+        },
     )
 
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5000, debug=True)
+    # Development server only; production runs under gunicorn (gunicorn.conf.py).
+    app.run(host="0.0.0.0", port=5000, debug=os.environ.get("FLASK_DEBUG") == "1")
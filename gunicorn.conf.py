@@ -0,0 +1,12 @@
+# Production server settings: gunicorn app:app
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gthread"
+threads = 4
+# Import Flask and lxml once in the master; workers share the pages.
+preload_app = True
+# Extractions of large workbooks can take a while to stream out.
+timeout = 120